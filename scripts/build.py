@@ -5,7 +5,10 @@
 Build the static site from RSS data + Jinja2 templates.
 
 - Reads feeds.yml (list of categories and their sources)
-- Downloads/normalizes items (title/link/source/date/summary)
+- Downloads feeds concurrently (aiohttp), then parses/normalizes items
+  one at a time (title/link/source/date/summary)
+- Uses conditional GET (ETag/Last-Modified, data/feed_cache.json) so
+  unchanged feeds are not downloaded or parsed again
 - Renders:
     - index.html      (home + all categories summary)
     - <category>.html (environment/water/wastewater/tenders/oil_gas_petrochem)
@@ -15,16 +18,29 @@ Build the static site from RSS data + Jinja2 templates.
 
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
+import heapq
 import html
+import json
 import re
+import shutil
 from dataclasses import dataclass, asdict
+from itertools import chain
+from operator import attrgetter
 from pathlib import Path
-from typing import Dict, List, Iterable
+from typing import Dict, List, Iterable, Optional, Set, Tuple
 
 import yaml
+import aiohttp
 import feedparser
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+try:
+    # لودر C (libyaml) اگر PyYAML با آن ساخته شده باشد
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 # ----------------------------
 # Paths
@@ -33,6 +49,15 @@ ROOT = Path(__file__).resolve().parents[1]
 TEMPLATES = ROOT / "templates"
 SITE_DIR = ROOT / "site"          # build output
 OUT = SITE_DIR                    # alias (برای راحتی)
+JINJA_CACHE = ROOT / ".jinja_cache"  # bytecode قالب‌ها بین اجراها (کش CI)
+FEED_CACHE = ROOT / "data" / "feed_cache.json"  # ETag/Last-Modified + آیتم‌های هر فید
+
+# حداکثر اتصال‌های هم‌زمان برای دریافت فیدها
+FETCH_CONCURRENCY = 20
+FETCH_TIMEOUT = 30  # ثانیه
+
+# الگوی حذف تگ‌های HTML (یک بار کامپایل می‌شود)
+_TAG_RE = re.compile(r"<[^>]+>")
 
 # ----------------------------
 # Config / constants
@@ -70,7 +95,6 @@ def load_config() -> SiteConfig:
     cfg_path = ROOT / "config_site.json"
     if cfg_path.exists():
         try:
-            import json
             data = json.loads(cfg_path.read_text(encoding="utf-8"))
             return SiteConfig(**{**asdict(SiteConfig()), **data})
         except Exception:
@@ -80,21 +104,18 @@ def load_config() -> SiteConfig:
 
 def load_feeds() -> Dict:
     feeds_path = ROOT / "feeds.yml"
-    data = yaml.safe_load(feeds_path.read_text(encoding="utf-8"))
+    data = yaml.load(feeds_path.read_text(encoding="utf-8"), Loader=YamlLoader)
     return data or {}
 
 def parse_date(entry) -> dt.datetime:
     # تلاش برای گرفتن تاریخ از entry
     # fallback = حال حاضر
+    # *_parsed از feedparser همیشه UTC است؛ مستقیم datetime آگاه از UTC می‌سازیم
     try:
         if getattr(entry, "published_parsed", None):
-            return dt.datetime.fromtimestamp(
-                dt.datetime(*entry.published_parsed[:6]).timestamp(), tz=dt.timezone.utc
-            )
+            return dt.datetime(*entry.published_parsed[:6], tzinfo=dt.timezone.utc)
         if getattr(entry, "updated_parsed", None):
-            return dt.datetime.fromtimestamp(
-                dt.datetime(*entry.updated_parsed[:6]).timestamp(), tz=dt.timezone.utc
-            )
+            return dt.datetime(*entry.updated_parsed[:6], tzinfo=dt.timezone.utc)
     except Exception:
         pass
     return dt.datetime.now(dt.timezone.utc)
@@ -104,10 +125,10 @@ def clean_text(s: str) -> str:
         return ""
     s = html.unescape(s)
     # حذف تگ‌های خیلی ساده
-    s = re.sub(r"<[^>]+>", "", s)
+    s = _TAG_RE.sub("", s)
     return s.strip()
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     title: str
     link: str
@@ -116,8 +137,72 @@ class Item:
     published_dt: dt.datetime
     category: str
 
-def fetch_source(url: str) -> Iterable[Item]:
-    fp = feedparser.parse(url)
+def load_feed_cache() -> Dict:
+    if FEED_CACHE.exists():
+        try:
+            return json.loads(FEED_CACHE.read_text(encoding="utf-8"))
+        except Exception:
+            # کش خراب = بدون کش (همه دوباره دریافت می‌شوند)
+            pass
+    return {}
+
+def save_feed_cache(cache: Dict) -> None:
+    FEED_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    FEED_CACHE.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+
+def item_to_cache(it: Item) -> Dict:
+    d = asdict(it)
+    d.pop("category")  # دسته از feeds.yml می‌آید، نه از کش
+    d["published_dt"] = it.published_dt.isoformat()
+    return d
+
+def item_from_cache(d: Dict, category: str) -> Item:
+    return Item(
+        **{**d, "published_dt": dt.datetime.fromisoformat(d["published_dt"])},
+        category=category,
+    )
+
+async def fetch_bytes(
+    session: aiohttp.ClientSession, url: str, cached: Dict
+) -> Tuple[Optional[bytes], Optional[str], Optional[str], Dict[str, str]]:
+    # GET شرطی؛ اگر فید تغییری نکرده باشد (304) data = None
+    # هدرهای پاسخ هم برمی‌گردند تا feedparser charset و آدرس پایه را بداند
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("modified"):
+        headers["If-Modified-Since"] = cached["modified"]
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304:
+            return None, cached.get("etag"), cached.get("modified"), {}
+        resp.raise_for_status()
+        data = await resp.read()
+        response_headers = {
+            "content-type": resp.headers.get("Content-Type", ""),
+            "content-location": str(resp.url),  # آدرس نهایی پس از redirect
+        }
+        etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        return data, etag, modified, response_headers
+
+async def fetch_all(urls: List[str], cache: Dict) -> List:
+    # فقط دریافت شبکه‌ای هم‌زمان است؛ خطاها به صورت Exception برمی‌گردند
+    connector = aiohttp.TCPConnector(limit=FETCH_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+    # همان هدرهای feedparser.parse(url)؛ بعضی CDNها UA عمومی aiohttp را رد می‌کنند
+    headers = {"User-Agent": feedparser.USER_AGENT, "Accept": feedparser.http.ACCEPT_HEADER}
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers=headers
+    ) as session:
+        return await asyncio.gather(
+            *[fetch_bytes(session, u, cache.get(u) or {}) for u in urls],
+            return_exceptions=True,
+        )
+
+def fetch_source(
+    url: str, data: bytes, category: str, response_headers: Dict[str, str]
+) -> Iterable[Item]:
+    # بدون هدرها، charset اعلام‌شده در HTTP و پایه‌ی لینک‌های نسبی از دست می‌رود
+    fp = feedparser.parse(data, response_headers=response_headers)
     src_title = fp.feed.get("title") or url
     for e in fp.entries:
         yield Item(
@@ -126,7 +211,7 @@ def fetch_source(url: str) -> Iterable[Item]:
             source=clean_text(src_title),
             summary=clean_text(e.get("summary", ""))[:400],
             published_dt=parse_date(e),
-            category="",  # بعداً پر می‌کنیم
+            category=category,
         )
 
 def aggregate(cfg: SiteConfig) -> Dict[str, List[Item]]:
@@ -140,19 +225,53 @@ def aggregate(cfg: SiteConfig) -> Dict[str, List[Item]]:
     }
 
     # feeds.yml انتظار: هر کلید یک لیست از URL ها
+    # فقط URL رشته‌ای قبول است؛ ورودی نامعتبر فقط همان فید را حذف می‌کند، نه کل build را
+    jobs = []
+    for key in pages.keys():
+        for u in feeds.get(key, []) or []:
+            if isinstance(u, str) and u.strip():
+                jobs.append((key, u.strip()))
+            else:
+                print(f"[WARN] skipping invalid feed entry in {key}: {u!r}")
+
+    # دریافت هم‌زمان، ولی parse یکی‌یکی (حافظه‌ی کمتر)
+    cache = load_feed_cache()
+    new_cache: Dict = {}
+    results = asyncio.run(fetch_all([u for _, u in jobs], cache))
+    # حذف تکراری‌ها (بر اساس لینک) همان موقع جمع‌آوری، برای هر دسته جدا
+    seen_links: Dict[str, Set[str]] = {key: set() for key in pages}
+    for (key, u), res in zip(jobs, results):
+        if isinstance(res, BaseException):
+            # اگر فید مشکل داشت، رد می‌کنیم (ولی کش قبلی‌اش را نگه می‌داریم)
+            if u in cache:
+                new_cache[u] = cache[u]
+            continue
+        data, etag, modified, response_headers = res
+        seen = seen_links[key]
+        try:
+            if data is None:
+                # 304: فید تغییری نکرده، آیتم‌های ذخیره‌شده را دوباره استفاده کن
+                items = [item_from_cache(d, key) for d in cache[u]["items"]]
+            else:
+                items = list(fetch_source(u, data, key, response_headers))
+            new_cache[u] = {
+                "etag": etag,
+                "modified": modified,
+                "items": [item_to_cache(it) for it in items],
+            }
+            for it in items:
+                if not it.link or it.link in seen:
+                    continue
+                seen.add(it.link)
+                pages[key].append(it)
+        except Exception:
+            pass
+
+    save_feed_cache(new_cache)
+
+    # مرتب‌سازی نزولی بر اساس زمان
     for key in pages.keys():
-        urls = feeds.get(key, []) or []
-        for u in urls:
-            try:
-                for it in fetch_source(u):
-                    it.category = key
-                    pages[key].append(it)
-            except Exception:
-                # اگر فید مشکل داشت، رد می‌کنیم
-                pass
-
-        # مرتب‌سازی نزولی بر اساس زمان
-        pages[key].sort(key=lambda x: x.published_dt, reverse=True)
+        pages[key].sort(key=attrgetter("published_dt"), reverse=True)
 
     return pages
 
@@ -160,14 +279,16 @@ def aggregate(cfg: SiteConfig) -> Dict[str, List[Item]]:
 # Rendering
 # ----------------------------
 
-def build_env() -> Environment:
-    env = Environment(
-        loader=FileSystemLoader(str(TEMPLATES)),
-        autoescape=select_autoescape(enabled_extensions=("html",)),
-        trim_blocks=True,
-        lstrip_blocks=True,
-    )
-    return env
+# یک Environment مشترک؛ کش قالب‌های کامپایل‌شده روی همین شیء نگه داشته می‌شود
+# و bytecode هم روی دیسک می‌ماند تا اجرای بعدی کامپایل را رد کند
+JINJA_CACHE.mkdir(exist_ok=True)
+ENV = Environment(
+    loader=FileSystemLoader(str(TEMPLATES)),
+    bytecode_cache=FileSystemBytecodeCache(directory=str(JINJA_CACHE), pattern="%s.cache"),
+    autoescape=select_autoescape(enabled_extensions=("html",)),
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
 
 def site_context(cfg: SiteConfig, pages: Dict[str, List[Item]]) -> Dict:
     # ناوبری بر اساس DEFAULT_NAV
@@ -183,52 +304,61 @@ def site_context(cfg: SiteConfig, pages: Dict[str, List[Item]]) -> Dict:
         }
     }
 
+def write_page(tpl: Template, path: Path, **ctx) -> None:
+    # خروجی تکه‌تکه و encode‌شده در یک فایل باینری با بافر بزرگ نوشته می‌شود
+    with open(path, "wb", buffering=1 << 20) as fp:
+        tpl.stream(**ctx).dump(fp, encoding="utf-8")
+
 def render(pages: Dict[str, List[Item]]) -> None:
     SITE_DIR.mkdir(parents=True, exist_ok=True)
 
-    env = build_env()
     cfg = load_config()
     ctx_site = site_context(cfg, pages)
+    updated_at = dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
 
     # ---------- Index ----------
-    tpl = env.get_template(PAGE_TEMPLATES["index"])
-    all_items: List[Item] = []
-    for k, lst in pages.items():
-        all_items.extend(lst)
-    all_items.sort(key=lambda x: x.published_dt, reverse=True)
+    tpl = ENV.get_template(PAGE_TEMPLATES["index"])
+    # فقط ۲۵۰ مورد جدیدتر لازم است؛ nlargest از مرتب‌سازی کامل ارزان‌تر است
+    # و chain لیست الحاقی همه‌ی دسته‌ها را اصلاً نمی‌سازد
+    top = heapq.nlargest(
+        250, chain.from_iterable(pages.values()), key=attrgetter("published_dt")
+    )
 
-    html_index = tpl.render(
+    write_page(
+        tpl,
+        OUT / "index.html",
         site=ctx_site["site"],
         site_title="home",
-        updated_at=dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+        updated_at=updated_at,
         pages=pages,
-        items=all_items[:250],
+        items=top,
     )
-    (OUT / "index.html").write_text(html_index, encoding="utf-8")
 
     # ---------- Category pages ----------
     for key in pages.keys():
-        tpl_page = env.get_template(PAGE_TEMPLATES[key])
-        html_page = tpl_page.render(
+        tpl_page = ENV.get_template(PAGE_TEMPLATES[key])
+        write_page(
+            tpl_page,
+            OUT / f"{key}.html",
             site=ctx_site["site"],
             page_title=key,
             items=pages[key],
-            updated_at=dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M UTC"),
+            updated_at=updated_at,
         )
-        (OUT / f"{key}.html").write_text(html_page, encoding="utf-8")
 
     # ---------- Crawler page ----------
-    tpl_crawler = env.get_template(PAGE_TEMPLATES["crawler"])
-    html_crawler = tpl_crawler.render(
+    tpl_crawler = ENV.get_template(PAGE_TEMPLATES["crawler"])
+    write_page(
+        tpl_crawler,
+        OUT / "crawler.html",
         site=ctx_site["site"],
         page_title="crawler",
     )
-    (OUT / "crawler.html").write_text(html_crawler, encoding="utf-8")
 
     # ---------- Copy styles.css if present ----------
     css = TEMPLATES / "styles.css"
     if css.exists():
-        (OUT / "styles.css").write_text(css.read_text(encoding="utf-8"), encoding="utf-8")
+        shutil.copyfile(css, OUT / "styles.css")
 
     print("[OK] render finished")
 
@@ -2,8 +2,12 @@
 # -*- coding: utf-8 -*-
 from pathlib import Path
 from datetime import datetime, timezone
-import json, time, re
+from concurrent.futures import ThreadPoolExecutor
+import re, threading, time
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -30,15 +34,42 @@ UA = {
                   "Chrome/124.0 Safari/537.36"
 }
 
+# یک Session مشترک تا اتصال (TCP+TLS) به DuckDuckGo بین کوئری‌ها reuse شود
+SESSION = requests.Session()
+SESSION.headers.update(UA)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=frozenset(["GET", "POST"]),  # جستجوی DDG با POST است
+    ),
+))
+
+# نخ‌های کاری (parse نتایج هم‌زمان با درخواست‌های بعدی انجام می‌شود)
+DDG_WORKERS = 3
+# حداکثر درخواست هم‌زمان به DuckDuckGo و وقفه‌ی هر درخواست، برای ادب نسبت به موتور جستجو
+DDG_PARALLEL = 2
+DDG_DELAY = 2  # ثانیه
+DDG_SLOTS = threading.Semaphore(DDG_PARALLEL)
+
 def ddg_search(query, max_items=15):
     """جستجو در DuckDuckGo HTML، خروجی: [{title, link, snippet}]"""
     try:
-        r = requests.post(DDG_URL, data={"q": query, "kl": "ir-fa"}, headers=UA, timeout=25)
+        with DDG_SLOTS:
+            print(f"[INFO] search: {query}")
+            try:
+                r = SESSION.post(DDG_URL, data={"q": query, "kl": "ir-fa"}, timeout=25)
+            finally:
+                # جایگاه تا پایان وقفه آزاد نمی‌شود
+                time.sleep(DDG_DELAY)
         r.raise_for_status()
     except Exception as ex:
         return {"error": f"request failed: {ex}", "items": []}
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.text, "lxml")  # پارسر C، خیلی سریع‌تر از html.parser
     items = []
     for res in soup.select("a.result__a"):
         title = res.get_text(" ", strip=True)
@@ -58,25 +89,30 @@ def normalize(q: str) -> str:
     q = re.sub(r"\s+", " ", q).strip()
     return q
 
+# کوئری را کمی غنی می‌کنیم: به دنبال کلمات مناقصه/مزایده/استعلام هم بگرد
+SUFFIX = ' (site:.ir OR site:.org OR site:.com) (مناقصه OR مزایده OR استعلام)'
+# کوئری‌های نهایی یک بار ساخته می‌شوند (هم‌ترتیب با KEYWORDS)
+QUERIES = [normalize(f'{kw} {SUFFIX}') for kw in KEYWORDS]
+
 def main():
-    # کوئری را کمی غنی می‌کنیم: به دنبال کلمات مناقصه/مزایده/استعلام هم بگرد
-    SUFFIX = ' (site:.ir OR site:.org OR site:.com) (مناقصه OR مزایده OR استعلام)'
     result = {"updated_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC"), "queries": []}
 
-    for kw in KEYWORDS:
-        q = normalize(f'{kw} {SUFFIX}')
-        print(f"[INFO] search: {q}")
-        data = ddg_search(q, max_items=15)
-        # وقفه کوتاه برای ادب نسبت به موتور جستجو
-        time.sleep(2)
-        result["queries"].append({
-            "keyword": kw,
-            "query": q,
-            "items": data["items"],
-            "error": data["error"],
-        })
+    try:
+        # کوئری‌ها هم‌زمان اجرا می‌شوند؛ map ترتیب KEYWORDS را حفظ می‌کند
+        with ThreadPoolExecutor(max_workers=DDG_WORKERS) as executor:
+            found = list(executor.map(lambda q: ddg_search(q, max_items=15), QUERIES))
+        for kw, q, data in zip(KEYWORDS, QUERIES, found):
+            result["queries"].append({
+                "keyword": kw,
+                "query": q,
+                "items": data["items"],
+                "error": data["error"],
+            })
+    finally:
+        SESSION.close()
 
-    OUT.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    # orjson مستقیم بایت UTF-8 تولید می‌کند (بدون encode جداگانه)
+    OUT.write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
     print(f"[OK] wrote {OUT}")
 
 if __name__ == "__main__":